@@ -0,0 +1,318 @@
+"""
+BoxNote Batch Converter
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+import argparse
+import logging
+import os
+import shutil
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from boxnote_archive import BoxNoteArchive, is_archive
+import boxnote_ir
+from docx_template import shared_template
+import html_parser
+import rate_limiter
+import render_cache
+import text_parser
+from work_queue import DEFAULT_LEASE_TTL, DEFAULT_POLL_INTERVAL, WorkQueue
+
+
+logger = logging.getLogger()
+
+output_suffix_map = {
+    'html': '.html',
+    'docx': '.docx',
+    'text': '.txt',
+}
+
+
+def collect_inputs(inputs: Iterable[Path]) -> List[Tuple[Path, Optional[str]]]:
+    """
+    Expand directories into the .boxnote files they contain and ZIP archives into their note members
+    """
+    result = []
+    for input_path in inputs:
+        if input_path.is_dir():
+            result.extend((note, None) for note in sorted(input_path.glob('*.boxnote')))
+        elif is_archive(input_path):
+            with BoxNoteArchive(input_path) as archive:
+                result.extend((input_path, name) for name in archive.note_names())
+        else:
+            result.append((input_path, None))
+    return result
+
+
+def get_output_names(tasks: List[Tuple[Path, Optional[str]]]) -> Dict[Tuple[Path, Optional[str]], PurePosixPath]:
+    """
+    Output path of every task relative to the output directory, without suffix.
+    Archive members mirror their folders, names still repeated (e.g. by two archives)
+    get a numbered suffix in task order, so every node of a queue agrees on them.
+    """
+    result = {}
+    used = set()
+    archives = {}
+    try:
+        for input_file, member in tasks:
+            if member:
+                if input_file not in archives:
+                    archives[input_file] = BoxNoteArchive(input_file)
+                base = archives[input_file].note_path(member)
+            else:
+                base = PurePosixPath(input_file.stem)
+            name = base
+            index = 1
+            while str(name).lower() in used:
+                index += 1
+                name = base.with_name(f'{base.name} ({index})')
+            used.add(str(name).lower())
+            result[(input_file, member)] = name
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return result
+
+
+_archives = {}
+
+
+def get_archive(path: Path) -> BoxNoteArchive:
+    """
+    Archives stay open for the lifetime of the worker process, the index is built once
+    """
+    if path not in _archives:
+        _archives[path] = BoxNoteArchive(path)
+    return _archives[path]
+
+
+def convert_file(
+        input_file: Path,
+        workdir: Path,
+        output_dir: Path,
+        output_formats: Sequence[str] = ('html',),
+        token: str = None,
+        user_id: str = None,
+        cache_size: int = 0,
+        member: str = None,
+        template_file: Path = None,
+        style_classes: bool = False,
+        output_name: PurePosixPath = None) -> List[Path]:
+    """
+    Convert a single BoxNote file, or a note member of a ZIP archive, to the requested formats
+    The note is parsed once, every format renders from the same IR
+    Outputs are written to output_name under output_dir, by default the note title
+    """
+    archive = get_archive(input_file) if member else None
+    title = archive.note_title(member) if archive else input_file.stem
+    output_name = output_name if output_name else (archive.note_path(member) if archive else PurePosixPath(title))
+    (output_dir / Path(output_name)).parent.mkdir(parents=True, exist_ok=True)
+    # rendered subtrees are shared by all notes converted in this worker process
+    cache = render_cache.shared_cache(cache_size) if cache_size else None
+    if archive:
+        content = archive.read_note(member)
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+    note = boxnote_ir.build(content, marks='html' in output_formats or 'docx' in output_formats)
+    results = []
+    if 'text' in output_formats:
+        output_file = output_dir / Path(f'{output_name}{output_suffix_map["text"]}')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            # text mode never touches styles or images, stream blocks to disk
+            f.writelines(text_parser.iter_text(note))
+        results.append(output_file)
+    if 'html' in output_formats or 'docx' in output_formats:
+        # standalone html embeds archive images, docx alone reads them from the archive
+        html = html_parser.parse(note, title, workdir, token, user_id, cache, archive, embed='html' in output_formats,
+                                 style_classes=style_classes, note_name=member)
+        if 'html' in output_formats:
+            output_file = output_dir / Path(f'{output_name}{output_suffix_map["html"]}')
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(html)
+            results.append(output_file)
+        if 'docx' in output_formats:
+            from docx_parser import html_to_docx
+            output_file = output_dir / Path(f'{output_name}{output_suffix_map["docx"]}')
+            html_to_docx(html, workdir, output_file.with_suffix(''), archive, shared_template(template_file))
+            results.append(output_file)
+    if cache is not None:
+        logger.debug(f'Render cache after {title}: {cache.stats()}')
+    return results
+
+
+def get_task_name(input_file: Path, workdir: Path) -> str:
+    """
+    Relative to the work directory so nodes with different mount points agree
+    """
+    try:
+        return input_file.relative_to(workdir).as_posix()
+    except ValueError:
+        return input_file.as_posix()
+
+
+def convert_queue(
+        tasks: List[Tuple[Path, Optional[str]]],
+        queue_dir: Path,
+        node_id: str,
+        lease_ttl: float,
+        workdir: Path,
+        output_dir: Path,
+        output_formats: Sequence[str] = ('html',),
+        token: str = None,
+        user_id: str = None,
+        cache_size: int = 0,
+        template_file: Path = None,
+        style_classes: bool = False,
+        output_names: Dict[Tuple[Path, Optional[str]], PurePosixPath] = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL) -> List[Path]:
+    """
+    Worker loop of the shared work queue: claim, convert and complete tasks
+    until every task is done, waiting for leases held by other nodes to finish or expire
+    """
+    queue = WorkQueue(queue_dir, node_id, lease_ttl, poll_interval)
+    results = []
+    pending = list(tasks)
+    while pending:
+        waiting = []
+        for input_file, member in pending:
+            task_id = queue.task_id(get_task_name(input_file, workdir), member if member else '')
+            if queue.is_done(task_id):
+                continue
+            lease = queue.claim(task_id)
+            if lease is None:
+                waiting.append((input_file, member))
+                continue
+            # outputs are staged and published only while the lease is still held,
+            # a node that lost its lease never overwrites the outputs of the node that reclaimed it
+            staging_dir = output_dir / f'.{task_id}.{lease.token}.staging'
+            try:
+                with lease.renewing():
+                    outputs = convert_file(input_file, workdir, staging_dir, output_formats, token, user_id,
+                                           cache_size, member, template_file, style_classes,
+                                           output_names.get((input_file, member)) if output_names else None)
+            except Exception as e:
+                # released so another worker may retry it, this worker does not
+                logger.error(f'Failed to convert {member if member else input_file}: {e}')
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                queue.release(lease)
+                continue
+            if lease.lost.is_set() or not lease.is_held():
+                logger.warning(f'Lost lease on {member if member else input_file}, discarding its outputs')
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                continue
+            outputs = publish_outputs(outputs, staging_dir, output_dir)
+            if queue.complete(lease, [str(output) for output in outputs]):
+                results.extend(outputs)
+        pending = waiting
+        if pending:
+            time.sleep(queue.poll_interval)
+    return results
+
+
+def publish_outputs(outputs: List[Path], staging_dir: Path, output_dir: Path) -> List[Path]:
+    """
+    Move staged outputs into place, each replace is atomic so readers never see a partial file
+    """
+    result = []
+    for output in outputs:
+        target = output_dir / output.relative_to(staging_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(output, target)
+        result.append(target)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return result
+
+
+def parse_batch(
+        input_files: Iterable[Path],
+        workdir: Path,
+        output_dir: Path = None,
+        output_formats: Union[str, Sequence[str]] = ('html',),
+        token: str = None,
+        user_id: str = None,
+        jobs: int = None,
+        cache_size: int = 0,
+        rate_limit: float = rate_limiter.DEFAULT_RATE,
+        template_file: Path = None,
+        queue_dir: Path = None,
+        node_id: str = None,
+        lease_ttl: float = DEFAULT_LEASE_TTL,
+        style_classes: bool = False) -> List[Path]:
+    """
+    Convert many BoxNote files in parallel worker processes
+    Set cache_size to memoize rendered HTML subtrees within each worker
+    Box API downloads of all workers share one rate_limit (requests per second)
+    DOCX output is cloned from template_file, parsed once per worker
+    With queue_dir on a shared filesystem, any number of nodes running the same batch
+    split the work through leases and every note is converted exactly once
+    With style_classes, HTML uses generated css classes instead of inline styles
+    """
+    output_formats = [output_formats] if isinstance(output_formats, str) else list(output_formats)
+    for output_format in output_formats:
+        if output_format not in output_suffix_map:
+            raise ValueError(f'Unsupported output format: {output_format}')
+    output_dir = output_dir if output_dir else workdir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = collect_inputs(input_files)
+    output_names = get_output_names(tasks)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=rate_limiter.configure, initargs=(rate_limit,)) as executor:
+        if queue_dir:
+            workers = jobs if jobs else os.cpu_count()
+            node_id = node_id if node_id else f'{socket.gethostname()}-{os.getpid()}'
+            # each worker starts at a different offset to reduce lease contention
+            futures = [executor.submit(convert_queue, tasks[i * len(tasks) // workers:] + tasks[:i * len(tasks) // workers],
+                                       queue_dir, f'{node_id}-{i}', lease_ttl, workdir, output_dir, output_formats,
+                                       token, user_id, cache_size, template_file, style_classes, output_names)
+                       for i in range(workers)]
+            for future in futures:
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    # unclaimed tasks are picked up by the other workers, completed ones stay done
+                    logger.error(f'Queue worker failed: {e}')
+        else:
+            futures = {executor.submit(convert_file, input_file, workdir, output_dir, output_formats, token, user_id,
+                                       cache_size, member, template_file, style_classes,
+                                       output_names[(input_file, member)]): member if member else input_file
+                       for input_file, member in tasks}
+            for future, input_file in futures.items():
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    logger.error(f'Failed to convert {input_file}: {e}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inputs', nargs='+', help='Input file, directory or ZIP archive names')
+    parser.add_argument('-d', '--dir', help='Work directory')
+    parser.add_argument('-f', '--format', nargs='+', choices=list(output_suffix_map.keys()), default=['html'],
+                        help='Output formats, all rendered from a single parse')
+    parser.add_argument('-O', '--output-dir', nargs='?', help='Output directory')
+    parser.add_argument('-j', '--jobs', type=int, nargs='?', help='Number of worker processes')
+    parser.add_argument('-c', '--cache-size', type=int, default=0, help='Rendered subtree cache entries per worker, 0 to disable')
+    parser.add_argument('-r', '--rate-limit', type=float, default=rate_limiter.DEFAULT_RATE, help='Box API requests per second across all workers')
+    parser.add_argument('--template', nargs='?', help='Template .docx or .dotx file for docx output')
+    parser.add_argument('-q', '--queue-dir', nargs='?', help='Shared work queue directory, for running the same batch on several nodes')
+    parser.add_argument('--node-id', nargs='?', help='Node name recorded in leases, defaults to host name and pid')
+    parser.add_argument('--lease-ttl', type=float, default=DEFAULT_LEASE_TTL, help='Seconds before a lease of a crashed node is reclaimed')
+    parser.add_argument('--css-classes', action='store_true', help='Use generated css classes instead of inline styles')
+    parser.add_argument('-t', '--token', nargs='?', help='Box access token')
+    parser.add_argument('-u', '--user', nargs='?', help='Box user id')
+    args = parser.parse_args()
+    workdir = Path(args.dir) if args.dir else Path.cwd()
+    input_files = [workdir / Path(input_name) for input_name in args.inputs]
+    output_dir = workdir / Path(args.output_dir) if args.output_dir else workdir
+    token = args.token if args.token else None
+    user_id = args.user if args.user else None
+    template_file = Path(args.template) if args.template else None
+    queue_dir = workdir / Path(args.queue_dir) if args.queue_dir else None
+    parse_batch(input_files, workdir, output_dir, args.format, token, user_id, args.jobs, args.cache_size, args.rate_limit,
+                template_file, queue_dir, args.node_id, args.lease_ttl, args.css_classes)
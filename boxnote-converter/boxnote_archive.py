@@ -0,0 +1,100 @@
+"""
+BoxNote Export ZIP Archive Reader
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+import base64
+from collections import defaultdict
+import mimetypes
+from pathlib import PurePosixPath
+import zipfile
+from typing import IO, List, Optional
+from mapper.html_mapper import get_image_name_pattern
+
+
+IMAGE_ROOT = 'Box Notes Images'
+
+
+class BoxNoteArchive:
+    """
+    Read notes and images straight from a Box export ZIP, nothing is extracted.
+    Members are indexed once from the central directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self.notes = {}
+        self.images = defaultdict(list)
+        for member in self.zip.infolist():
+            if member.is_dir():
+                continue
+            member_path = PurePosixPath(member.filename)
+            if member_path.suffix == '.boxnote':
+                self.notes[member.filename] = member_path.stem
+            elif len(member_path.parts) >= 3 and member_path.parts[-3] == IMAGE_ROOT \
+                    and member_path.parts[-2].endswith(' Images'):
+                # images live next to their note, <note dir>/Box Notes Images/<title> Images/
+                title = member_path.parts[-2][:-len(' Images')]
+                self.images[(str(PurePosixPath(*member_path.parts[:-3])), title)].append(member.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.zip.close()
+
+    def note_names(self) -> List[str]:
+        return sorted(self.notes.keys())
+
+    def note_title(self, name: str) -> str:
+        return self.notes[name]
+
+    def note_path(self, name: str) -> PurePosixPath:
+        """
+        Output path of a note without suffix, mirroring its folder so notes with equal titles do not collide
+        """
+        folders = [part for part in PurePosixPath(name).parent.parts if part not in ('/', '.', '..')]
+        return PurePosixPath(*folders, self.notes[name])
+
+    def read_note(self, name: str) -> str:
+        return self.zip.read(name).decode('utf-8')
+
+    def has_member(self, name: str) -> bool:
+        try:
+            self.zip.getinfo(name)
+        except KeyError:
+            return False
+        return True
+
+    def find_image(self, title: str, file_name: str, note_name: str = None) -> Optional[str]:
+        """
+        Find the archive member of a note image, same naming rules as the images directory
+        Images are looked up next to note_name, without it in any folder with a note of that title
+        """
+        pattern = get_image_name_pattern(file_name)
+        if note_name:
+            candidates = self.images.get((str(PurePosixPath(note_name).parent), title), [])
+        else:
+            candidates = [name for (_, image_title), names in self.images.items() if image_title == title for name in names]
+        for name in candidates:
+            if pattern.match(PurePosixPath(name).name):
+                return name
+        return None
+
+    def open_image(self, name: str) -> IO[bytes]:
+        return self.zip.open(name)
+
+    def image_data_uri(self, name: str) -> str:
+        mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        with self.zip.open(name) as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        return f'data:{mime_type};base64,{data}'
+
+
+def is_archive(path) -> bool:
+    return str(path).lower().endswith('.zip') and zipfile.is_zipfile(path)
@@ -0,0 +1,139 @@
+"""
+BoxNote Intermediate Representation
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+import json
+import logging
+import sys
+from types import MappingProxyType
+from typing import Dict, Hashable, Mapping, Tuple, Union
+
+
+logger = logging.getLogger()
+
+EMPTY_ATTRS = MappingProxyType({})
+
+# marks which never affect any output format, dropped while building
+ignored_mark_types = frozenset(['author_id', 'annotation_id'])
+
+# bound the intern table for long running batch workers
+MAX_INTERNED_MARKS = 65536
+
+
+class Mark:
+    """
+    Inline formatting mark, interned so equal marks share one object
+    """
+    __slots__ = ('type', 'attrs')
+
+    def __init__(self, type: str, attrs: Mapping = EMPTY_ATTRS):
+        self.type = type
+        self.attrs = attrs
+
+    def __repr__(self):
+        return f'Mark({self.type!r}, {dict(self.attrs)!r})'
+
+
+class Node:
+    """
+    BoxNote node, text is only set on text nodes
+    """
+    __slots__ = ('type', 'attrs', 'marks', 'content', 'text')
+
+    def __init__(
+            self,
+            type: str,
+            attrs: Mapping = EMPTY_ATTRS,
+            marks: Tuple[Mark, ...] = (),
+            content: Tuple['Node', ...] = (),
+            text: str = ''):
+        self.type = type
+        self.attrs = attrs
+        self.marks = marks
+        self.content = content
+        self.text = text
+
+    def __repr__(self):
+        return f'Node({self.type!r}, {len(self.content)} children)'
+
+
+_marks: Dict[Hashable, Mark] = {}
+
+
+def get_mark(mark: Dict) -> Mark:
+    type_tag = mark.get('type', '')
+    attrs = mark.get('attrs')
+    try:
+        key = (type_tag, tuple(sorted(attrs.items()))) if attrs else type_tag
+        interned = _marks.get(key)
+    except TypeError:
+        # unhashable attribute values, e.g. lists, are rare enough to serialize
+        key = (type_tag, json.dumps(attrs, sort_keys=True))
+        interned = _marks.get(key)
+    if interned is None:
+        interned = Mark(sys.intern(type_tag), attrs if attrs else EMPTY_ATTRS)
+        if len(_marks) < MAX_INTERNED_MARKS:
+            _marks[key] = interned
+    return interned
+
+
+def load_boxnote(boxnote_content: Union[str, bytes, bytearray]) -> Dict:
+    """
+    Load and validate BoxNote JSON
+    """
+    try:
+        boxnote = json.loads(boxnote_content)
+    except json.JSONDecodeError as e:
+        logger.error('Invalid BoxNote content: JSON parse failed')
+        raise e
+    
+    if 'doc' not in boxnote:
+        logger.error('Invalid BoxNote content: no doc field')
+        raise ValueError('Invalid BoxNote content: no doc field')
+
+    if 'content' not in boxnote.get('doc', {}):
+        logger.error('Invalid BoxNote content: no content field')
+        raise ValueError('Invalid BoxNote content: no content field')
+    return boxnote
+
+
+def build(boxnote_content: Union[str, bytes, bytearray, Dict], marks: bool = True) -> Node:
+    """
+    Build the IR of a BoxNote once, every output format renders from it
+    Without marks, e.g. for plain text output, inline formatting is not interned at all
+    """
+    boxnote = boxnote_content if isinstance(boxnote_content, dict) else load_boxnote(boxnote_content)
+    return Node('doc', content=build_content(boxnote.get('doc', {}).get('content', []), marks))
+
+
+def build_content(content, marks: bool = True) -> Tuple[Node, ...]:
+    if not content:
+        return ()
+    if isinstance(content, dict):
+        return build_node(content, marks),
+    if not isinstance(content, list):
+        return ()
+    return tuple([build_node(item, marks) for item in content if type(item) is dict])
+
+
+def build_node(content: Dict, marks: bool = True) -> Node:
+    try:
+        type_tag = content['type']
+    except KeyError:
+        logger.error('Invalid BoxNote content: no type field')
+        raise ValueError('Invalid BoxNote content: no type field')
+    node_marks = content.get('marks') if marks else None
+    if node_marks:
+        node_marks = tuple([get_mark(mark) for mark in node_marks if mark.get('type') not in ignored_mark_types])
+    children = content.get('content')
+    if children:
+        children = tuple([build_node(item, marks) for item in children if type(item) is dict]) \
+            if type(children) is list else build_content(children, marks)
+    return Node(
+        sys.intern(type_tag),
+        content.get('attrs') or EMPTY_ATTRS,
+        node_marks if node_marks else (),
+        children if children else (),
+        content.get('text', ''))
@@ -7,6 +7,9 @@ import argparse
 from html_parser import parse
 from pathlib import Path
 from h2d import HtmlToDocx
+from render_cache import RenderCache
+from boxnote_archive import BoxNoteArchive, is_archive
+from docx_template import DocumentTemplate, shared_template
 
 
 def parse_docx(
@@ -16,14 +19,38 @@ def parse_docx(
         title: str,
         output_file: Path,
         output_docx: Path,
-        user_id: str) -> None:
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+        user_id: str,
+        cache: RenderCache = None,
+        archive: BoxNoteArchive = None,
+        template: DocumentTemplate = None,
+        style_classes: bool = False) -> None:
+    if archive:
+        # input_file is the note member name inside the archive
+        content = archive.read_note(str(input_file))
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+    # the html is written next to the docx, archive member names would not resolve from there
+    html = parse(content, title, workdir, token, user_id, cache, archive, embed=archive is not None,
+                 style_classes=style_classes, note_name=str(input_file) if archive else None)
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(parse(content, title, workdir, token, user_id))
-    docx_parser = HtmlToDocx(workdir)
+        f.write(html)
+    html_to_docx(html, workdir, output_docx, archive, template)
+
+
+def html_to_docx(
+        html: str,
+        workdir: Path,
+        output_docx: Path,
+        archive: BoxNoteArchive = None,
+        template: DocumentTemplate = None) -> None:
+    """
+    Convert rendered BoxNote HTML to DOCX, saved as output_docx with .docx appended
+    """
+    docx_parser = HtmlToDocx(workdir, archive, template)
     docx_parser.table_style = 'TableGrid'
-    docx_parser.parse_html_file(output_file.absolute(), output_docx.absolute())
+    docx_parser.parse_html_to_file(html, output_docx.absolute())
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -32,13 +59,28 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--token', nargs='?', help='Box access token')
     parser.add_argument('-o', '--output', nargs='?', help='Output file name')
     parser.add_argument('-u', '--user', nargs='?', help='Box user id')
+    parser.add_argument('--template', nargs='?', help='Template .docx or .dotx file')
+    parser.add_argument('--css-classes', action='store_true', help='Use generated css classes instead of inline styles')
     args = parser.parse_args()
     workdir = Path(args.dir) if args.dir else Path.cwd()
     input_file = workdir / Path(args.input)
-    title = Path(input_file).stem
-    output_file = workdir / Path(f'{title}.html')
-    output_docx_file = Path(args.output) if args.output else Path(input_file.name)
-    output_docx = workdir / output_docx_file
     token = args.token if args.token else None
     user_id = args.user if args.user else None
-    parse_docx(token, workdir, input_file, title, output_file, output_docx, user_id)
+    template = shared_template(args.template) if args.template else None
+    if is_archive(input_file):
+        with BoxNoteArchive(input_file) as archive:
+            for name in archive.note_names():
+                title = archive.note_title(name)
+                # mirror the folders of the archive, titles repeat across them
+                output_file = workdir / Path(f'{archive.note_path(name)}.html')
+                output_docx = workdir / Path(f'{archive.note_path(name)}.boxnote')
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                parse_docx(token, workdir, name, title, output_file, output_docx, user_id, archive=archive, template=template,
+                           style_classes=args.css_classes)
+    else:
+        title = Path(input_file).stem
+        output_file = workdir / Path(f'{title}.html')
+        output_docx_file = Path(args.output) if args.output else Path(input_file.name)
+        output_docx = workdir / output_docx_file
+        parse_docx(token, workdir, input_file, title, output_file, output_docx, user_id, template=template,
+                   style_classes=args.css_classes)
@@ -0,0 +1,87 @@
+"""
+Warm DOCX Template Pool
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+import copy
+import io
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, IO
+
+import docx
+from docx import Document
+
+
+TEMPLATE_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml'
+DOCUMENT_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+# the template Document() opens without arguments, shipped inside the python-docx package
+DEFAULT_TEMPLATE_FILE = Path(docx.__file__).parent / 'templates' / 'default.docx'
+
+
+class DocumentTemplate:
+    """
+    Template package parsed once, every conversion gets a cheap deep copy.
+    Style ids are resolved by name once and shared by all copies.
+    """
+
+    def __init__(self, template_file: Path = None):
+        self.template_file = template_file
+        self._document = Document(load_template(template_file))
+        self._style_ids = {}
+        self._lock = threading.Lock()
+
+    def new_document(self) -> docx.document.Document:
+        with self._lock:
+            return copy.deepcopy(self._document)
+
+    def get_style_id(self, name: str) -> str:
+        """
+        Style id for a style name (or id), raises KeyError if the template lacks it
+        """
+        if name not in self._style_ids:
+            with self._lock:
+                styles = list(self._document.styles)
+                style = next((s for s in styles if s.name == name), None) \
+                    or next((s for s in styles if s.style_id == name), None)
+                if style is None:
+                    raise KeyError(f"no style with name '{name}'")
+                self._style_ids[name] = style.style_id
+        return self._style_ids[name]
+
+
+def load_template(template_file: Path = None) -> IO[bytes]:
+    """
+    Read the template package into memory, .dotx templates are retyped as documents
+    """
+    template_file = template_file if template_file else DEFAULT_TEMPLATE_FILE
+    with open(template_file, 'rb') as f:
+        blob = f.read()
+    if str(template_file).lower().endswith('.dotx'):
+        source = zipfile.ZipFile(io.BytesIO(blob))
+        target = io.BytesIO()
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as package:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == '[Content_Types].xml':
+                    data = data.replace(TEMPLATE_CONTENT_TYPE.encode('utf-8'), DOCUMENT_CONTENT_TYPE.encode('utf-8'))
+                package.writestr(item, data)
+        blob = target.getvalue()
+    return io.BytesIO(blob)
+
+
+_templates: Dict[str, DocumentTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def shared_template(template_file: Path = None) -> DocumentTemplate:
+    """
+    Process wide template per template file, None for the python-docx default
+    """
+    key = str(Path(template_file).absolute()) if template_file else ''
+    with _templates_lock:
+        if key not in _templates:
+            _templates[key] = DocumentTemplate(template_file)
+        return _templates[key]
@@ -5,6 +5,9 @@ Removed some configurable options for simplification.
 Added support for some other tags for boxnote-converter
 '''
 
+import base64
+import io
+import logging
 import pathlib
 import re
 import os
@@ -12,7 +15,6 @@ from urllib.parse import urlparse
 from html.parser import HTMLParser
 
 import docx, docx.table
-from docx import Document
 from docx.shared import RGBColor, Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_COLOR_INDEX
 from docx.oxml import OxmlElement
@@ -20,6 +22,10 @@ from docx.oxml.ns import qn
 
 from bs4 import BeautifulSoup
 
+from docx_template import shared_template
+
+logger = logging.getLogger()
+
 # values in inches
 INDENT = 0.25
 LIST_INDENT = 0.5
@@ -52,6 +58,43 @@ def delete_paragraph(paragraph):
     p.getparent().remove(p)
     p._p = p._element = None
 
+def count_runs(element):
+    return sum(1 for _ in element.iter(qn('w:r')))
+
+def run_merge_key(r):
+    # only runs holding at most one plain text element can be merged
+    children = [child for child in r if child.tag != qn('w:rPr')]
+    if len(children) > 1 or (children and children[0].tag != qn('w:t')):
+        return None
+    rPr = r.find(qn('w:rPr'))
+    # python-docx elements serialize themselves, no direct lxml use
+    return rPr.xml if rPr is not None else ''
+
+def coalesce_runs(document):
+    """
+    Merge adjacent runs with identical formatting within each paragraph.
+    Returns the run counts before and after.
+    """
+    body = document.element.body
+    before = count_runs(body)
+    for p in body.iter(qn('w:p')):
+        previous, previous_key = None, None
+        for child in list(p):
+            key = run_merge_key(child) if child.tag == qn('w:r') else None
+            if key is None or key != previous_key:
+                previous, previous_key = child, key
+                continue
+            t = child.find(qn('w:t'))
+            if t is not None:
+                previous_t = previous.find(qn('w:t'))
+                if previous_t is None:
+                    previous.append(t)
+                else:
+                    previous_t.text = (previous_t.text or '') + (t.text or '')
+                    previous_t.set(qn('xml:space'), 'preserve')
+            p.remove(child)
+    return before, count_runs(body)
+
 font_styles = {
     'b': 'bold',
     'strong': 'bold',
@@ -76,7 +119,7 @@ styles = {
 
 class HtmlToDocx(HTMLParser):
 
-    def __init__(self, workdir=None):
+    def __init__(self, workdir=None, archive=None, template=None):
         super().__init__()
         self.table_row_selectors = [
             'table > tr',
@@ -87,6 +130,17 @@ class HtmlToDocx(HTMLParser):
         self.table_style = DEFAULT_TABLE_STYLE
         self.paragraph_style = DEFAULT_PARAGRAPH_STYLE
         self.workdir = workdir
+        # BoxNoteArchive to read images from instead of the work directory
+        self.archive = archive
+        # pre-parsed DocumentTemplate, new documents are cloned from it
+        self.template = template if template else shared_template()
+        # whether the target document comes from self.template, so cached style ids apply
+        self.template_styles = False
+        # merge adjacent identically formatted runs once the document is built
+        self.coalesce = True
+        self.run_counts = None
+        # parsed css class rules from the <style> block, class name -> style dict
+        self.class_styles = {}
 
     def set_initial_attrs(self, document=None):
         self.tags = {
@@ -94,7 +148,11 @@ class HtmlToDocx(HTMLParser):
             'list': [],
             'blockquote': []
         }
-        self.doc = document if document else Document()
+        if document is None:
+            self.template_styles = True
+        elif isinstance(document, docx.document.Document):
+            self.template_styles = False
+        self.doc = document if document else self.template.new_document()
         self.document = self.doc
         self.paragraph = None
         self.skip = False
@@ -107,6 +165,10 @@ class HtmlToDocx(HTMLParser):
         self.table_style = other.table_style
         self.paragraph_style = other.paragraph_style
         self.workdir = other.workdir
+        self.archive = other.archive
+        self.template = other.template
+        self.template_styles = other.template_styles
+        self.class_styles = other.class_styles
 
     def get_cell_html(self, soup):
         return ' '.join([str(i) for i in soup.contents])
@@ -167,13 +229,37 @@ class HtmlToDocx(HTMLParser):
             self.run._r.rPr.append(shd)
 
     def apply_paragraph_style(self, style=None):
+        style = style if style else self.paragraph_style
         try:
-            if style:
+            if style and self.template_styles:
+                # skip the by-name lookup, the style id is resolved once per template
+                self.paragraph._p.style = self.template.get_style_id(style)
+            elif style:
                 self.paragraph.style = style
-            elif self.paragraph_style:
-                self.paragraph.style = self.paragraph_style
         except KeyError as e:
-            raise ValueError(f"Unable to apply style {self.paragraph_style}.") from e
+            raise ValueError(f"Unable to apply style {style}.") from e
+
+    def apply_table_style(self):
+        try:
+            if self.table_style and self.template_styles:
+                self.table._tbl.tblStyle_val = self.template.get_style_id(self.table_style)
+            elif self.table_style:
+                self.table.style = self.table_style
+        except KeyError as e:
+            raise ValueError(f"Unable to apply style {self.table_style}.") from e
+
+    def parse_class_styles(self, css):
+        for class_name, declarations in re.findall(r'\.([\w-]+)\s*\{([^}]*)\}', css):
+            self.class_styles[class_name] = self.parse_dict_string(declarations)
+
+    def get_style(self, attrs):
+        # class rules are parsed once per document, inline style overrides them
+        style = {}
+        for class_name in (attrs.get('class') or '').split():
+            style.update(self.class_styles.get(class_name, {}))
+        if attrs.get('style'):
+            style.update(self.parse_dict_string(attrs['style']))
+        return style
 
     def parse_dict_string(self, string, separator=';'):
         new_string = string.replace(" ", '').split(separator)
@@ -192,7 +278,8 @@ class HtmlToDocx(HTMLParser):
         else:
             list_style = styles['LIST_BULLET']
 
-        self.paragraph = self.doc.add_paragraph(style=list_style)            
+        self.paragraph = self.doc.add_paragraph()
+        self.apply_paragraph_style(list_style)
         self.paragraph.paragraph_format.left_indent = Inches(min(list_depth * LIST_INDENT, MAX_INDENT))
         self.paragraph.paragraph_format.line_spacing = 1
 
@@ -204,12 +291,21 @@ class HtmlToDocx(HTMLParser):
     def handle_img(self, current_attrs):
         src = current_attrs['src']
         if src:
-            src_path = pathlib.Path(src) if not self.workdir else self.workdir / pathlib.Path(src)
+            if src.startswith('data:'):
+                # embedded image, e.g. html rendered from a zip archive
+                image = io.BytesIO(base64.b64decode(src.split(',', 1)[-1]))
+            elif self.archive and self.archive.has_member(src):
+                # stream straight from the zip member, no temp file
+                with self.archive.open_image(src) as f:
+                    image = io.BytesIO(f.read())
+            else:
+                src_path = pathlib.Path(src) if not self.workdir else self.workdir / pathlib.Path(src)
+                image = str(src_path.absolute())
             try:
                 if isinstance(self.doc, docx.document.Document):
-                    self.doc.add_picture(str(src_path.absolute()))
+                    self.doc.add_picture(image)
                 else:
-                    self.add_image_to_cell(str(src_path.absolute()))
+                    self.add_image_to_cell(self.doc, image)
             except FileNotFoundError:
                 src = None
 
@@ -225,11 +321,7 @@ class HtmlToDocx(HTMLParser):
         rows, cols = self.get_table_dimensions(table_soup)
         self.table = self.doc.add_table(rows, cols)
 
-        if self.table_style:
-            try:
-                self.table.style = self.table_style
-            except KeyError as e:
-                raise ValueError(f"Unable to apply style {self.table_style}.") from e
+        self.apply_table_style()
 
         rows = self.get_table_rows(table_soup)
         cell_row = 0
@@ -291,6 +383,7 @@ class HtmlToDocx(HTMLParser):
             return
         if tag == 'style':
             self.style = True
+            self.style_data = []
             return
 
         current_attrs = dict(attrs)
@@ -336,7 +429,8 @@ class HtmlToDocx(HTMLParser):
         elif re.match('h[1-9]', tag):
             if isinstance(self.doc, docx.document.Document):
                 h_size = int(tag[1])
-                self.paragraph = self.doc.add_heading(level=min(h_size, 9))
+                self.paragraph = self.doc.add_paragraph()
+                self.apply_paragraph_style(f'Heading {min(h_size, 9)}')
             else:
                 self.paragraph = self.doc.add_paragraph()
         elif tag == 'img':
@@ -352,8 +446,8 @@ class HtmlToDocx(HTMLParser):
         if tag in ['p', 'li', 'pre']:
             self.run = self.paragraph.add_run()
         # add style
-        if 'style' in current_attrs and self.paragraph:
-            style = self.parse_dict_string(current_attrs['style'])
+        style = self.get_style(current_attrs)
+        if style and self.paragraph:
             self.add_styles_to_paragraph(style)
 
     def handle_endtag(self, tag):
@@ -369,6 +463,7 @@ class HtmlToDocx(HTMLParser):
 
         if tag == 'style':
             self.style = False
+            self.parse_class_styles(''.join(self.style_data))
             return
 
         if tag == 'span':
@@ -392,7 +487,10 @@ class HtmlToDocx(HTMLParser):
             self.tags.pop(tag)
 
     def handle_data(self, data):
-        if self.skip or self.style:
+        if self.style:
+            self.style_data.append(data)
+            return
+        if self.skip:
             return
 
         #if 'pre' not in self.tags:
@@ -429,8 +527,8 @@ class HtmlToDocx(HTMLParser):
             
             spans = self.tags['span']
             for span in spans:
-                if 'style' in span:
-                    style = self.parse_dict_string(span['style'])
+                style = self.get_style(span)
+                if style:
                     self.add_styles_to_run(style)
 
     def ignore_nested_tables(self, tables_soup):
@@ -487,11 +585,20 @@ class HtmlToDocx(HTMLParser):
     def parse_html_file(self, filename_html, filename_docx=None):
         with open(filename_html, 'r', encoding='utf-8') as infile:
             html = infile.read()
-        self.set_initial_attrs()
-        self.run_process(html)
         if not filename_docx:
             path, filename = os.path.split(filename_html)
             filename_docx = '%s/new_docx_file_%s' % (path, filename)
+        self.parse_html_to_file(html, filename_docx)
+
+    def coalesce_runs(self):
+        if self.coalesce:
+            self.run_counts = coalesce_runs(self.doc)
+            logger.info(f'Coalesced runs: {self.run_counts[0]} -> {self.run_counts[1]}')
+
+    def parse_html_to_file(self, html, filename_docx):
+        self.set_initial_attrs()
+        self.run_process(html)
+        self.coalesce_runs()
         # cleanup empty paragraph at the beginning
         for paragraph in self.doc.paragraphs:
             if len(paragraph.text) == 0:
@@ -503,4 +610,5 @@ class HtmlToDocx(HTMLParser):
     def parse_html_string(self, html):
         self.set_initial_attrs()
         self.run_process(html)
+        self.coalesce_runs()
         return self.doc
@@ -4,11 +4,13 @@ Author: XZhouQD
 Since: Dec 30 2022
 """
 
-import json
-from typing import Dict, List, Union
+from typing import Dict, Hashable, List, Union
 import logging
 import mapper.html_mapper as html_mapper
 from pathlib import Path
+from boxnote_ir import Node, build
+from render_cache import RenderCache, block_types, subtree_key
+from boxnote_archive import BoxNoteArchive, is_archive
 
 
 log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -16,104 +18,160 @@ logging.basicConfig(format=log_format, level=logging.INFO)
 logger = logging.getLogger()
 token = None
 user = None
+archive = None
+archive_note = None
+embed_images = False
+css_classes = False
+used_classes = set()
 
 
 def parse(
-        boxnote_content: Union[str, bytes, bytearray],
+        boxnote_content: Union[str, bytes, bytearray, Node],
         title: str = None,
         workdir: Path = None,
         access_token: str = None,
-        user_id: str = None) -> str:
+        user_id: str = None,
+        cache: RenderCache = None,
+        note_archive: BoxNoteArchive = None,
+        embed: bool = False,
+        style_classes: bool = False,
+        note_name: str = None) -> str:
     """
-    Parse BoxNote to HTML
+    Parse BoxNote (content or its IR from boxnote_ir.build) to HTML
+    Pass a RenderCache to reuse rendered HTML of identical block subtrees
+    Pass a BoxNoteArchive to resolve images from a Box export ZIP, embed inlines them as data URIs
+    note_name is the archive member of the note, its images are resolved from the same folder
+    With style_classes, inline styles are replaced by generated classes in the <style> block
+    Not thread-safe, render state is kept in module globals
     """
     global token
     token = access_token if access_token else token
     global user
     user = user_id if user_id else user
-    try:
-        boxnote = json.loads(boxnote_content)
-    except json.JSONDecodeError as e:
-        logger.error('Invalid BoxNote content: JSON parse failed')
-        raise e
-    
-    if 'doc' not in boxnote:
-        logger.error('Invalid BoxNote content: no doc field')
-        raise ValueError('Invalid BoxNote content: no doc field')
-
-    if 'content' not in boxnote.get('doc', {}):
-        logger.error('Invalid BoxNote content: no content field')
-        raise ValueError('Invalid BoxNote content: no content field')
+    global archive
+    archive = note_archive
+    global archive_note
+    archive_note = note_name
+    global embed_images
+    embed_images = embed
+    global css_classes
+    css_classes = style_classes
+    global used_classes
+    used_classes = set()
+    note = boxnote_content if isinstance(boxnote_content, Node) else build(boxnote_content)
 
     contents = ['<!DOCTYPE html>', '<html>', f'{html_mapper.get_base_style()}', '<head>', '<meta charset="UTF-8">', f'<title>{title}</title>', '</head>', '<body>']
 
-    parse_content(boxnote.get('doc', {}).get('content', {}), contents, title, workdir)
+    # block keys are computed lazily during rendering, only when a cache is used
+    keys = {} if cache is not None else None
+    parse_content(note.content, contents, title, workdir, cache=cache, keys=keys)
 
     contents = list(filter(lambda x: x is not None, contents))
     contents.extend(['</body>', '</html>'])
     result = ''.join(contents)
     # remove empty paragraph
-    result = str.replace(result, '<p style="text-align: left"></p>', '')
+    empty_paragraph = html_mapper.get_tag_open('paragraph', alignment='left')
+    empty_paragraph = html_mapper.style_to_class(empty_paragraph) if css_classes else empty_paragraph
+    result = str.replace(result, empty_paragraph + html_mapper.get_tag_close('paragraph'), '')
+    if css_classes:
+        # class rules are only known once every block is rendered
+        base_style = html_mapper.get_base_style()
+        result = result.replace(base_style, html_mapper.get_base_style(html_mapper.get_class_rules(used_classes)), 1)
     return result
 
 
+def get_tag_open(tag: str, **kwargs) -> str:
+    result = html_mapper.get_tag_open(tag, **kwargs)
+    return html_mapper.style_to_class(result, used_classes) if css_classes else result
+
+
 def parse_content(
-        content: Union[Dict, List],
+        content: Union[Node, tuple],
         contents: List[str],
         title: str,
         workdir: Path,
-        ignore_paragraph: bool = False) -> None:
+        ignore_paragraph: bool = False,
+        cache: RenderCache = None,
+        keys: Dict[int, Hashable] = None) -> None:
     """
     Parse BoxNote content
     """
+    global used_classes
     if not content:
         return
 
-    if isinstance(content, list):
+    if isinstance(content, tuple):
         for item in content:
-            parse_content(item, contents, title, workdir, ignore_paragraph)
+            parse_content(item, contents, title, workdir, ignore_paragraph, cache, keys)
         return
 
-    if not isinstance(content, dict):
+    type_tag = content.type
+    subtree = subtree_key(content, keys) if cache is not None and type_tag in block_types else None
+    if subtree is not None:
+        key = (subtree, ignore_paragraph, css_classes)
+        cached = cache.get(key)
+        if cached is not None:
+            fragment, fragment_classes = cached
+            contents.append(fragment)
+            used_classes.update(fragment_classes)
+            return
+        # collect the classes of this subtree alone, a hit must restore them too
+        outer_classes = used_classes
+        used_classes = set()
+        start = len(contents)
+        parse_node(content, contents, title, workdir, ignore_paragraph, cache, keys)
+        fragment_classes = frozenset(used_classes)
+        used_classes = outer_classes
+        used_classes.update(fragment_classes)
+        cache.put(key, (''.join(filter(None, contents[start:])), fragment_classes))
         return
+    parse_node(content, contents, title, workdir, ignore_paragraph, cache, keys)
 
-    if 'type' not in content:
-        logger.error('Invalid BoxNote content: no type field')
-        raise ValueError('Invalid BoxNote content: no type field')
-    
-    type_tag = content.get('type', '')
+
+def parse_node(
+        content: Node,
+        contents: List[str],
+        title: str,
+        workdir: Path,
+        ignore_paragraph: bool = False,
+        cache: RenderCache = None,
+        keys: Dict[int, Hashable] = None) -> None:
+    """
+    Parse a single BoxNote node
+    """
+    type_tag = content.type
     if type_tag == 'paragraph':
         if not ignore_paragraph:
             alignment = 'left'
-            marks = content.get('marks', [])
-            for mark in marks:
-                if mark.get('type', '') == 'alignment':
-                    alignment = mark.get('attrs', {}).get('alignment', '')
-            contents.append(html_mapper.get_tag_open('paragraph', alignment=alignment))
-            parse_content(content.get('content', []), contents, title, workdir)
+            for mark in content.marks:
+                if mark.type == 'alignment':
+                    alignment = mark.attrs.get('alignment', '')
+            contents.append(get_tag_open('paragraph', alignment=alignment))
+            parse_content(content.content, contents, title, workdir, cache=cache, keys=keys)
             contents.append(html_mapper.get_tag_close('paragraph'))
         else:
-            parse_content(content.get('content', []), contents, title, workdir)
+            parse_content(content.content, contents, title, workdir, cache=cache, keys=keys)
     elif type_tag == 'text':
-        contents.append(html_mapper.get_tag_open('text'))
-        contents.append(html_mapper.handle_text_marks(content.get('marks', []), content.get('text', '')))
+        contents.append(get_tag_open('text'))
+        contents.append(html_mapper.handle_text_marks(content.marks, content.text, css_classes, used_classes))
         contents.append(html_mapper.get_tag_close('text'))
     elif type_tag == 'check_list_item':
-        args = {'checked': 'checked' if content['attrs']['checked'] else '', 'x': 'X' if content['attrs']['checked'] else '  '}
-        contents.append(html_mapper.get_tag_open('check_list_item', **args))
-        parse_content(content.get('content', []), contents, title, workdir, ignore_paragraph=True)
+        args = {'checked': 'checked' if content.attrs['checked'] else '', 'x': 'X' if content.attrs['checked'] else '  '}
+        contents.append(get_tag_open('check_list_item', **args))
+        parse_content(content.content, contents, title, workdir, ignore_paragraph=True, cache=cache, keys=keys)
         contents.append(html_mapper.get_tag_close('check_list_item'))
     elif type_tag in ['list_item', 'table_cell', 'call_out_box']:
-        contents.append(html_mapper.get_tag_open(type_tag, **content.get('attrs', {})))
-        parse_content(content.get('content', []), contents, title, workdir, ignore_paragraph=True)
-        contents.append(html_mapper.get_tag_close(type_tag, **content.get('attrs', {})))
+        contents.append(get_tag_open(type_tag, **content.attrs))
+        parse_content(content.content, contents, title, workdir, ignore_paragraph=True, cache=cache, keys=keys)
+        contents.append(html_mapper.get_tag_close(type_tag, **content.attrs))
     elif type_tag == 'image':
-        contents.append(html_mapper.handle_image(content.get('attrs', {}), title, workdir, token, user))
+        contents.append(html_mapper.handle_image(content.attrs, title, workdir, token, user, archive, embed_images,
+                                                 archive_note))
     elif type_tag in ['strong', 'em', 'underline', 'strikethrough', 'ordered_list', 'bullet_list', 'blockquote', 'code_block', 
                       'check_list', 'table', 'table_row', 'heading', 'link', 'font_size', 'font_color', 'horizontal_rule']:
-        contents.append(html_mapper.get_tag_open(type_tag, **content.get('attrs', {})))
-        parse_content(content.get('content', []), contents, title, workdir)
-        contents.append(html_mapper.get_tag_close(type_tag, **content.get('attrs', {})))
+        contents.append(get_tag_open(type_tag, **content.attrs))
+        parse_content(content.content, contents, title, workdir, cache=cache, keys=keys)
+        contents.append(html_mapper.get_tag_close(type_tag, **content.attrs))
     
 
 if __name__ == '__main__':
@@ -124,14 +182,26 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--token', nargs='?', help='Box access token')
     parser.add_argument('-o', '--output', nargs='?', help='Output file')
     parser.add_argument('-u', '--user', nargs='?', help='Box user id')
+    parser.add_argument('--css-classes', action='store_true', help='Use generated css classes instead of inline styles')
     args = parser.parse_args()
     workdir = Path(args.dir) if args.dir else Path.cwd()
     input_file = workdir / Path(args.input)
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    title = input_file.stem
     token = args.token if args.token else None
     user_id = args.user if args.user else None
-    output_file = workdir / Path(args.output) if args.output else workdir / Path(f'{title}.html')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(parse(content, title, workdir, token, user_id))
+    if is_archive(input_file):
+        # convert every note in the archive, images are embedded from it
+        with BoxNoteArchive(input_file) as zip_archive:
+            for name in zip_archive.note_names():
+                title = zip_archive.note_title(name)
+                output_file = workdir / Path(f'{zip_archive.note_path(name)}.html')
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(parse(zip_archive.read_note(name), title, workdir, token, user_id,
+                                  note_archive=zip_archive, embed=True, style_classes=args.css_classes, note_name=name))
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        title = input_file.stem
+        output_file = workdir / Path(args.output) if args.output else workdir / Path(f'{title}.html')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(parse(content, title, workdir, token, user_id, style_classes=args.css_classes))
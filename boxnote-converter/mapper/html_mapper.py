@@ -4,15 +4,25 @@ Author: XZhouQD
 Since: Dec 30 2022
 """
 
-from typing import Dict, List
+from typing import Dict, Iterable, Sequence, Set
+from hashlib import blake2b
 import logging
 from pathlib import Path
 import re
+import time
 import requests
+import rate_limiter
+from rate_limiter import RateLimiter
+from boxnote_ir import Mark
 
 
 logger = logging.getLogger()
 
+box_api_url = 'https://api.box.com/2.0'
+request_timeout = 60
+max_retries = 5
+retry_status_codes = [429, 500, 502, 503, 504]
+
 
 base_style = '''<style type="text/css">
 table {
@@ -58,6 +68,12 @@ pre {
 </style>'''
 
 
+# css class mode, every distinct inline style becomes one generated class
+style_class_prefix = 'bn-'
+style_classes: Dict[str, str] = {}
+style_attr_pattern = re.compile(r'style="([^"]*)"')
+
+
 tag_open_map = {
     'paragraph': '<p style="text-align: {alignment}">',
     #'text': '',
@@ -127,18 +143,59 @@ def get_tag_close(tag: str, **kwargs) -> str:
     return None
 
 
-def get_base_style() -> str:
+def get_base_style(class_rules: str = '') -> str:
+    if class_rules:
+        return base_style.replace('</style>', f'{class_rules}\n</style>')
     return base_style
 
 
-def handle_text_marks(marks: List[Dict], text: str) -> str:
-    tag_starts = [tag_open_map.get(mark['type'], '').format(**mark.get('attrs', {})) for mark in marks]
-    tag_ends = [tag_close_map.get(mark['type'], '') for mark in marks[::-1]]
+def get_style_class(style: str) -> str:
+    # named by content so class names are stable across notes and cached fragments
+    class_name = f'{style_class_prefix}{blake2b(style.encode("utf-8"), digest_size=8).hexdigest()}'
+    known_style = style_classes.setdefault(class_name, style)
+    if known_style != style:
+        raise ValueError(f'Style class {class_name} collides: "{known_style}" and "{style}"')
+    return class_name
+
+
+def style_to_class(tag: str, used_classes: Set[str] = None) -> str:
+    """
+    Replace the inline style of a tag by its class, recording the class in used_classes
+    """
+    if not tag:
+        return tag
+
+    def replace(match: re.Match) -> str:
+        class_name = get_style_class(match.group(1))
+        if used_classes is not None:
+            used_classes.add(class_name)
+        return f'class="{class_name}"'
+
+    return style_attr_pattern.sub(replace, tag)
+
+
+def get_class_rules(class_names: Iterable[str]) -> str:
+    return '\n'.join(f'.{class_name} {{ {style_classes[class_name]} }}' for class_name in sorted(class_names))
+
+
+def handle_text_marks(marks: Sequence[Mark], text: str, css_classes: bool = False, used_classes: Set[str] = None) -> str:
+    tag_starts = [tag_open_map.get(mark.type, '').format(**mark.attrs) for mark in marks]
+    if css_classes:
+        tag_starts = [style_to_class(tag, used_classes) for tag in tag_starts]
+    tag_ends = [tag_close_map.get(mark.type, '') for mark in marks[::-1]]
     result = ''.join(tag_starts) + text + ''.join(tag_ends)
     return result
 
 
-def handle_image(attrs: Dict[str, str], title: str, workdir: Path, token: str = None, user: str = None) -> str:
+def handle_image(
+        attrs: Dict[str, str],
+        title: str,
+        workdir: Path,
+        token: str = None,
+        user: str = None,
+        archive=None,
+        embed_images: bool = False,
+        note_name: str = None) -> str:
     if token:
         box_file_id = attrs.get('boxFileId')
         box_file_name = attrs.get('fileName')
@@ -148,37 +205,69 @@ def handle_image(attrs: Dict[str, str], title: str, workdir: Path, token: str =
             if downloaded_path:
                 return tag_open_map.get('image').format(src=downloaded_path) + tag_close_map.get('image')
     file_name = attrs.get('fileName')
-    if file_name:
+    if file_name and archive:
+        # resolve from the archive index, embed to keep the html self-contained
+        member = archive.find_image(title, file_name, note_name)
+        if member:
+            src = archive.image_data_uri(member) if embed_images else member
+            return tag_open_map.get('image').format(src=src) + tag_close_map.get('image')
+    elif file_name:
         file_stem = Path(file_name).stem
         file_ext = Path(file_name).suffix
         image_dir = workdir / Path(f'Box Notes Images/{title} Images/')
         matches = list(image_dir.glob(f'{file_stem}*{file_ext}'))
-        # support file names with box versions
-        # e.g. "image.png", "image (1234567890).png"
-        pattern = re.compile(f'{file_stem}\s*(\([0-9]+\))*{file_ext}')
+        pattern = get_image_name_pattern(file_name)
         matches = [match for match in matches if pattern.match(match.name)]
         if len(matches) > 0:
             return tag_open_map.get('image').format(src=Path(*matches[0].parts[1:])) + tag_close_map.get('image')
     return ''
 
 
-def download_image(box_file_id: str, file_name: str, workdir: Path, token: str, user: str) -> Path:
+def get_image_name_pattern(file_name: str) -> re.Pattern:
+    # support file names with box versions
+    # e.g. "image.png", "image (1234567890).png"
+    file_stem = Path(file_name).stem
+    file_ext = Path(file_name).suffix
+    return re.compile(f'{file_stem}\s*(\([0-9]+\))*{file_ext}')
+
+
+def download_image(box_file_id: str, file_name: str, workdir: Path, token: str, user: str, limiter: RateLimiter = None) -> Path:
     if not token.startswith("Bearer "):
         token = "Bearer " + token
     headers = {
         'Authorization': token,
         'As-User': user
     }
-    url = f'https://api.box.com/2.0/files/{box_file_id}/content'
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        file_path = Path(f'{box_file_id}_{file_name}')
-        logger.info(f'Saving image to {file_path}')
-        with open(workdir / file_path, 'wb') as f:
-            f.write(response.content)
-        return file_path
-    else:
-        logger.error(f'Failed to download image {file_name}')
-        logger.info(f'Response status code: {response.status_code}')
-        logger.info(f'Response content: {response.content}')
-        return None
+    limiter = limiter if limiter else rate_limiter.shared_limiter()
+    url = f'{box_api_url}/files/{box_file_id}/content'
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            response = requests.get(url, headers=headers, timeout=request_timeout)
+        except requests.RequestException as e:
+            logger.warning(f'Failed to download image {file_name}: {e}')
+            delay = rate_limiter.backoff_delay(attempt)
+        else:
+            if response.status_code == 200:
+                limiter.succeeded()
+                file_path = Path(f'{box_file_id}_{file_name}')
+                logger.info(f'Saving image to {file_path}')
+                with open(workdir / file_path, 'wb') as f:
+                    f.write(response.content)
+                return file_path
+            if response.status_code not in retry_status_codes:
+                logger.error(f'Failed to download image {file_name}')
+                logger.info(f'Response status code: {response.status_code}')
+                logger.info(f'Response content: {response.content}')
+                return None
+            retry_after = rate_limiter.parse_retry_after(response.headers.get('Retry-After'))
+            delay = retry_after if retry_after is not None else rate_limiter.backoff_delay(attempt)
+            logger.warning(f'Retrying image {file_name} in {delay:.1f}s (status code {response.status_code})')
+            if response.status_code == 429:
+                # the limiter pauses all workers, next acquire waits for it
+                limiter.throttled(delay)
+                continue
+        if attempt < max_retries:
+            time.sleep(delay)
+    logger.error(f'Failed to download image {file_name} after {max_retries + 1} attempts')
+    return None
@@ -0,0 +1,151 @@
+"""
+Mock Box API Server
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+from pathlib import Path
+import random
+import re
+import tempfile
+import threading
+import time
+from typing import Dict
+
+import mapper.html_mapper as html_mapper
+from rate_limiter import RateLimiter
+
+
+logger = logging.getLogger()
+
+content_path_pattern = re.compile(r'^/2\.0/files/([^/]+)/content$')
+
+DEFAULT_SERVER_RATE = 5.0
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class MockBoxServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Box file content endpoint that throttles like Box does.
+    Requests above rate per second get 429 with Retry-After, a fraction of the
+    others fail with 503, everything else returns a small fake image.
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            port: int = 0,
+            rate: float = DEFAULT_SERVER_RATE,
+            retry_after: float = DEFAULT_RETRY_AFTER,
+            error_rate: float = 0.0):
+        super().__init__(('127.0.0.1', port), MockBoxHandler)
+        self.rate = rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.counts = {'requests': 0, 'ok': 0, 'throttled': 0, 'errors': 0}
+        self._tokens = rate
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def api_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/2.0'
+
+    def take(self) -> int:
+        """
+        Status code for the next request
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.counts['requests'] += 1
+            if self._tokens < 1:
+                self.counts['throttled'] += 1
+                return 429
+            self._tokens -= 1
+            if random.random() < self.error_rate:
+                self.counts['errors'] += 1
+                return 503
+            self.counts['ok'] += 1
+            return 200
+
+
+class MockBoxHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        match = content_path_pattern.match(self.path)
+        if not match:
+            self.send_error(404)
+            return
+        status = self.server.take()
+        if status == 429:
+            self.send_response(429)
+            self.send_header('Retry-After', f'{self.server.retry_after:g}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if status != 200:
+            self.send_error(status)
+            return
+        body = f'image {match.group(1)}'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def run_harness(
+        images: int = 50,
+        threads: int = 8,
+        client_rate: float = 4.0,
+        server_rate: float = DEFAULT_SERVER_RATE,
+        error_rate: float = 0.1) -> Dict[str, int]:
+    """
+    Download images through download_image from a throttling mock server,
+    returns the server counters and the number of images lost
+    """
+    with MockBoxServer(rate=server_rate, error_rate=error_rate) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        api_url = html_mapper.box_api_url
+        html_mapper.box_api_url = server.api_url
+        limiter = RateLimiter(client_rate)
+        try:
+            with tempfile.TemporaryDirectory() as workdir, ThreadPoolExecutor(max_workers=threads) as executor:
+                downloads = [executor.submit(html_mapper.download_image, str(i), f'image{i}.png', Path(workdir),
+                                             'token', 'user', limiter) for i in range(images)]
+                lost = sum(1 for download in downloads if download.result() is None)
+        finally:
+            html_mapper.box_api_url = api_url
+            server.shutdown()
+        return dict(server.counts, lost=lost)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--port', type=int, default=8080, help='Port to serve on')
+    parser.add_argument('-r', '--rate', type=float, default=DEFAULT_SERVER_RATE, help='Requests per second before throttling')
+    parser.add_argument('--retry-after', type=float, default=DEFAULT_RETRY_AFTER, help='Retry-After seconds sent with 429')
+    parser.add_argument('-e', '--error-rate', type=float, default=0.0, help='Fraction of requests failing with 503')
+    parser.add_argument('--harness', action='store_true', help='Run a throttled download harness against the server and exit')
+    parser.add_argument('-n', '--images', type=int, default=50, help='Images downloaded by the harness')
+    parser.add_argument('-j', '--threads', type=int, default=8, help='Download threads of the harness')
+    parser.add_argument('-c', '--client-rate', type=float, default=4.0, help='Client rate limit of the harness')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.harness:
+        result = run_harness(args.images, args.threads, args.client_rate, args.rate, args.error_rate)
+        logger.info(f'Harness result: {result}')
+        raise SystemExit(1 if result['lost'] else 0)
+    with MockBoxServer(args.port, args.rate, args.retry_after, args.error_rate) as server:
+        logger.info(f'Mock Box API on {server.api_url}, set html_mapper.box_api_url to it')
+        server.serve_forever()
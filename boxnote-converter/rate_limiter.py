@@ -0,0 +1,178 @@
+"""
+Box API Rate Limiter
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking (e.g. Windows), limiter is then shared across threads only
+    fcntl = None
+
+
+logger = logging.getLogger()
+
+# Box allows roughly 1000 API calls per minute per user, stay just under it
+DEFAULT_RATE = 15.0
+DEFAULT_MIN_RATE = 0.5
+# fraction of the configured rate recovered after each successful call
+RECOVERY_STEP = 0.05
+# one file per user, the temp directory is shared by everyone on the host
+DEFAULT_STATE_FILE = Path(tempfile.gettempdir()) / f'boxnote-converter-rate-limit-{os.getuid() if hasattr(os, "getuid") else 0}.json'
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class RateLimiter:
+    """
+    Token bucket limiter with adaptive rate.
+    With a state file, the bucket is shared by every process using the same file.
+    """
+
+    def __init__(
+            self,
+            rate: float = DEFAULT_RATE,
+            burst: float = None,
+            state_file: Path = None,
+            min_rate: float = DEFAULT_MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst if burst else rate
+        self.state_file = Path(state_file) if state_file and fcntl else None
+        self._lock = threading.Lock()
+        self._state = self._initial_state()
+
+    def _initial_state(self) -> Dict[str, float]:
+        return {'tokens': self.burst, 'updated': time.time(), 'rate': self.max_rate, 'blocked_until': 0.0}
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, float]]:
+        with self._lock:
+            if not self.state_file:
+                yield self._state
+                return
+            try:
+                f = open(self.state_file, 'a+', encoding='utf-8')
+            except OSError as e:
+                # never abort a conversion over the shared state, limit this process only
+                logger.warning(f'Rate limit state file {self.state_file} unavailable, limiting per process: {e}')
+                self.state_file = None
+                yield self._state
+                return
+            with f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read())
+                    except ValueError:
+                        state = self._initial_state()
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, float], now: float) -> None:
+        state['rate'] = min(state.get('rate', self.max_rate), self.max_rate)
+        elapsed = max(0.0, now - state.get('updated', now))
+        state['tokens'] = min(self.burst, state.get('tokens', self.burst) + elapsed * state['rate'])
+        state['updated'] = now
+
+    def acquire(self) -> None:
+        """
+        Block until a request may be sent
+        """
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                self._refill(state, now)
+                blocked_until = state.get('blocked_until', 0.0)
+                if now < blocked_until:
+                    wait = blocked_until - now
+                elif state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                else:
+                    wait = (1 - state['tokens']) / state['rate']
+            time.sleep(wait)
+
+    def throttled(self, retry_after: float) -> None:
+        """
+        Halve the rate and pause every client until retry_after seconds from now
+        """
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state['rate'] = max(self.min_rate, state['rate'] / 2)
+            state['tokens'] = 0.0
+            state['blocked_until'] = max(state.get('blocked_until', 0.0), now + retry_after)
+            logger.warning(f'Box API throttled, pausing {retry_after:.1f}s at {state["rate"]:.2f} requests/s')
+
+    def succeeded(self) -> None:
+        """
+        Slowly recover the rate after a successful request
+        """
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state['rate'] = min(self.max_rate, state['rate'] + self.max_rate * RECOVERY_STEP)
+
+
+_shared_limiter = None
+
+
+def configure(rate: float = DEFAULT_RATE, burst: float = None, state_file: Path = DEFAULT_STATE_FILE) -> RateLimiter:
+    """
+    Replace the process wide limiter used for Box API calls
+    """
+    global _shared_limiter
+    _shared_limiter = RateLimiter(rate, burst, state_file)
+    return _shared_limiter
+
+
+def shared_limiter() -> RateLimiter:
+    """
+    Process wide limiter, coordinated with other processes through DEFAULT_STATE_FILE
+    """
+    if _shared_limiter is None:
+        return configure()
+    return _shared_limiter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with jitter
+    """
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
@@ -0,0 +1,115 @@
+"""
+BoxNote Rendered Subtree Cache
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+from collections import OrderedDict
+import threading
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Hashable, Optional, Tuple
+from boxnote_ir import Node
+
+
+# block level nodes whose rendered output is memoized
+block_types = ['paragraph', 'heading', 'bullet_list', 'ordered_list', 'list_item', 'check_list', 'check_list_item',
+               'table', 'table_row', 'table_cell', 'call_out_box', 'blockquote', 'code_block']
+
+# nodes with side effects or note specific output, subtrees containing them are never cached
+uncacheable_types = ['image']
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class RenderCache:
+    """
+    LRU cache of rendered block level subtrees, keyed by subtree structure.
+    Each entry is the rendered html and the style classes it uses.
+    Shared across notes in one process, html_parser.parse is not thread-safe
+    since it keeps its render state in module globals, render one note at a time.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, FrozenSet[str]]]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Tuple[str, FrozenSet[str]]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+_shared_cache = None
+
+
+def shared_cache(max_entries: int = DEFAULT_MAX_ENTRIES) -> RenderCache:
+    """
+    Process wide cache, e.g. for all notes converted by one batch worker
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = RenderCache(max_entries)
+    return _shared_cache
+
+
+def subtree_key(content: Node, keys: Dict[int, Optional[Hashable]]) -> Optional[Hashable]:
+    """
+    Structural key of a block subtree, None if it is uncacheable.
+    Computed lazily when the block is rendered, memoized by node id in keys
+    so nested blocks of a missed subtree are not walked again.
+    """
+    node_id = id(content)
+    if node_id in keys:
+        return keys[node_id]
+    key = _key(content, keys)
+    keys[node_id] = key
+    return key
+
+
+def _key(content: Node, keys: Dict[int, Optional[Hashable]]) -> Optional[Hashable]:
+    if content.type in uncacheable_types:
+        return None
+    children = []
+    for child in content.content:
+        child_key = subtree_key(child, keys) if child.type in block_types else _key(child, keys)
+        if child_key is None:
+            return None
+        children.append(child_key)
+    # marks are interned by boxnote_ir, equal marks are the same object
+    return content.type, _freeze(content.attrs) if content.attrs else (), content.marks, content.text, tuple(children)
+
+
+def _freeze(value) -> Hashable:
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type is dict or value_type is MappingProxyType:
+        return tuple(sorted([(name, _freeze(item)) for name, item in value.items()]))
+    if value_type is list:
+        return tuple([_freeze(item) for item in value])
+    # keep 1, 1.0 and True apart, they render differently
+    return value_type, value
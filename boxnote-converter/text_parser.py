@@ -0,0 +1,160 @@
+"""
+BoxNote to Plain Text Parser
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+from typing import Iterator, Tuple, Union
+from boxnote_ir import Node, build
+from boxnote_archive import BoxNoteArchive, is_archive
+from pathlib import Path
+
+
+# separators are stable so that downstream indexers can split on them
+PARAGRAPH_SEPARATOR = '\n\n'
+LINE_SEPARATOR = '\n'
+CELL_SEPARATOR = '\t'
+LIST_INDENT = '  '
+
+list_prefix_map = {
+    'bullet_list': '- ',
+    'ordered_list': '{index}. ',
+    'check_list': '[{x}] ',
+}
+
+list_types = list(list_prefix_map.keys())
+
+
+def parse(boxnote_content: Union[str, bytes, bytearray, Node]) -> str:
+    """
+    Parse BoxNote (content or its IR from boxnote_ir.build) to plain text
+    """
+    return ''.join(iter_text(boxnote_content))
+
+
+def iter_text(boxnote_content: Union[str, bytes, bytearray, Node]) -> Iterator[str]:
+    """
+    Stream BoxNote plain text block by block
+    """
+    # plain text never renders inline formatting, marks are not built
+    note = boxnote_content if isinstance(boxnote_content, Node) else build(boxnote_content, marks=False)
+    yield from iter_blocks(note.content)
+
+
+def iter_blocks(content: Union[Node, Tuple[Node, ...]]) -> Iterator[str]:
+    """
+    Yield text blocks of BoxNote content, each ending with its separator
+    """
+    if not content:
+        return
+
+    if isinstance(content, tuple):
+        for item in content:
+            yield from iter_blocks(item)
+        return
+
+    type_tag = content.type
+    if type_tag == 'paragraph':
+        text = get_text(content)
+        if text:
+            yield text + PARAGRAPH_SEPARATOR
+    elif type_tag == 'heading':
+        level = content.attrs.get('level', 1)
+        yield '#' * int(level) + ' ' + get_text(content) + PARAGRAPH_SEPARATOR
+    elif type_tag in list_types:
+        yield from iter_list(content, 0)
+        yield LINE_SEPARATOR
+    elif type_tag == 'table':
+        for row in content.content:
+            cells = [get_text(cell, ' ') for cell in row.content]
+            yield CELL_SEPARATOR.join(escape_cell(cell) for cell in cells) + LINE_SEPARATOR
+        yield LINE_SEPARATOR
+    elif type_tag == 'blockquote':
+        # quote the joined blocks so inner list and table separators stay as they are
+        text = ''.join(iter_blocks(content.content)).rstrip(LINE_SEPARATOR)
+        if text:
+            lines = text.split(LINE_SEPARATOR)
+            yield LINE_SEPARATOR.join('> ' + line if line else '>' for line in lines) + PARAGRAPH_SEPARATOR
+    elif type_tag == 'code_block':
+        yield '```' + LINE_SEPARATOR + get_text(content) + LINE_SEPARATOR + '```' + PARAGRAPH_SEPARATOR
+    elif type_tag == 'call_out_box':
+        emoji = content.attrs.get('emoji', '')
+        text = get_text(content, ' ')
+        if text:
+            yield (f'{emoji} {text}' if emoji else text) + PARAGRAPH_SEPARATOR
+    elif type_tag == 'horizontal_rule':
+        yield '---' + PARAGRAPH_SEPARATOR
+    elif type_tag == 'image':
+        # images are skipped entirely, no resolution or download
+        return
+    else:
+        yield from iter_blocks(content.content)
+
+
+def iter_list(content: Node, depth: int) -> Iterator[str]:
+    """
+    Yield one line per list item, nested lists are indented
+    """
+    prefix = list_prefix_map.get(content.type, '- ')
+    for index, item in enumerate(content.content, start=1):
+        children = item.content
+        text = ' '.join(filter(None, [get_text(child) for child in children if child.type not in list_types]))
+        checked = item.attrs.get('checked', False)
+        yield LIST_INDENT * depth + prefix.format(index=index, x='x' if checked else ' ') + text + LINE_SEPARATOR
+        for child in children:
+            if child.type in list_types:
+                yield from iter_list(child, depth + 1)
+
+
+def get_text(content: Union[Node, Tuple[Node, ...]], separator: str = LINE_SEPARATOR) -> str:
+    """
+    Collect inline text of a node, joining its child blocks with separator
+    """
+    if not content:
+        return ''
+
+    if isinstance(content, tuple):
+        return separator.join(filter(None, [get_text(item, separator) for item in content]))
+
+    type_tag = content.type
+    if type_tag == 'text':
+        return content.text
+    if type_tag == 'hard_break':
+        return LINE_SEPARATOR
+    children = content.content
+    if type_tag in ['paragraph', 'heading', 'code_block']:
+        return ''.join(get_text(child, separator) for child in children)
+    return get_text(children, separator)
+
+
+def escape_cell(text: str) -> str:
+    """
+    Keep table cell text on one line so separators stay stable
+    """
+    return ' '.join(text.split())
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', help='Input file')
+    parser.add_argument('-d', '--dir', help='Work directory')
+    parser.add_argument('-o', '--output', nargs='?', help='Output file')
+    args = parser.parse_args()
+    workdir = Path(args.dir) if args.dir else Path.cwd()
+    input_file = workdir / Path(args.input)
+    if is_archive(input_file):
+        # extract the text of every note in the archive
+        with BoxNoteArchive(input_file) as archive:
+            for name in archive.note_names():
+                output_file = workdir / Path(f'{archive.note_path(name)}.txt')
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.writelines(iter_text(archive.read_note(name)))
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        title = input_file.stem
+        output_file = workdir / Path(args.output) if args.output else workdir / Path(f'{title}.txt')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.writelines(iter_text(content))
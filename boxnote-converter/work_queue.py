@@ -0,0 +1,305 @@
+"""
+Shared Filesystem Work Queue
+Author: XZhouQD
+Since: Oct 19 2026
+"""
+
+from contextlib import contextmanager
+from hashlib import sha1
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+
+logger = logging.getLogger()
+
+DEFAULT_LEASE_TTL = 60.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+class Lease:
+    """
+    Claim on a task, kept alive by touching the lease file.
+    lost is set once renewal finds another node reclaimed it, work done under it must then be discarded.
+    Node clocks are assumed to be roughly in sync.
+    """
+
+    def __init__(self, task_id: str, path: Path, token: str, ttl: float):
+        self.task_id = task_id
+        self.path = path
+        self.token = token
+        self.ttl = ttl
+        self.lost = threading.Event()
+
+    def is_held(self) -> bool:
+        lease = read_lease(self.path)
+        return lease is not None and lease.get('token') == self.token
+
+    def renew(self) -> bool:
+        """
+        Extend the lease, False once another node reclaimed it
+        """
+        if not self.is_held():
+            self.lost.set()
+            return False
+        try:
+            os.utime(self.path, None)
+        except FileNotFoundError:
+            self.lost.set()
+            return False
+        return True
+
+    @contextmanager
+    def renewing(self) -> Iterator['Lease']:
+        """
+        Renew the lease in a background thread while the block runs
+        """
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(self.ttl / 3):
+                if not self.renew():
+                    logger.warning(f'Lost lease on task {self.task_id}')
+                    return
+
+        thread = threading.Thread(target=renew_loop, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+
+class WorkQueue:
+    """
+    Exactly-once task claiming for any number of nodes sharing one directory.
+    A task is claimed by exclusively linking its lease file into place, expired leases of
+    crashed nodes are reclaimed, and completion is an atomic rename of a done marker.
+    """
+
+    def __init__(
+            self,
+            queue_dir: Path,
+            node_id: str = None,
+            lease_ttl: float = DEFAULT_LEASE_TTL,
+            poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.queue_dir = Path(queue_dir)
+        self.node_id = node_id if node_id else f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.lease_dir = self.queue_dir / 'leases'
+        self.done_dir = self.queue_dir / 'done'
+        self.completed_dir = self.queue_dir / 'completed'
+        self.lease_dir.mkdir(parents=True, exist_ok=True)
+        self.done_dir.mkdir(parents=True, exist_ok=True)
+        self.completed_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def task_id(*parts: str) -> str:
+        return sha1('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def lease_path(self, task_id: str) -> Path:
+        return self.lease_dir / f'{task_id}.lease'
+
+    def done_path(self, task_id: str) -> Path:
+        return self.done_dir / f'{task_id}.done'
+
+    def is_done(self, task_id: str) -> bool:
+        return self.done_path(task_id).exists()
+
+    def claim(self, task_id: str) -> Optional[Lease]:
+        """
+        Try to claim a task, None if it is done or leased by a live node
+        """
+        if self.is_done(task_id):
+            return None
+        path = self.lease_path(task_id)
+        lease = self._create(task_id, path)
+        if lease is None and self._reclaim(task_id, path):
+            lease = self._create(task_id, path)
+        # a node may have completed it between the checks
+        if lease is not None and self.is_done(task_id):
+            self.release(lease)
+            return None
+        return lease
+
+    def complete(self, lease: Lease, outputs: List[str] = None) -> bool:
+        """
+        Record completion atomically, False if the lease was lost meanwhile
+        """
+        if not lease.is_held():
+            logger.warning(f'Task {lease.task_id} was reclaimed by another node, not marking done')
+            return False
+        record = {'node': self.node_id, 'completed': time.time(), 'outputs': outputs if outputs else []}
+        temp_path = self.done_dir / f'.{lease.task_id}.{lease.token}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.done_path(lease.task_id))
+        # one record per completion, a task completed twice would show up as two
+        open(self.completed_dir / f'{lease.task_id}.{lease.token}', 'w').close()
+        self.release(lease)
+        return True
+
+    def completions(self, task_id: str) -> int:
+        return len(list(self.completed_dir.glob(f'{task_id}.*')))
+
+    def release(self, lease: Lease) -> None:
+        if lease.is_held():
+            try:
+                os.unlink(lease.path)
+            except FileNotFoundError:
+                pass
+
+    def _create(self, task_id: str, path: Path) -> Optional[Lease]:
+        """
+        Write the lease aside and link it into place, so a lease file is never seen half written
+        """
+        token = uuid.uuid4().hex
+        record = {'node': self.node_id, 'token': token, 'claimed': time.time()}
+        temp_path = path.with_name(f'.{path.name}.{token}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record))
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            return None
+        finally:
+            os.unlink(temp_path)
+        return Lease(task_id, path, token, self.lease_ttl)
+
+    def _is_expired(self, path: Path) -> bool:
+        try:
+            return os.stat(path).st_mtime + self.lease_ttl < time.time()
+        except FileNotFoundError:
+            return True
+
+    def _reclaim(self, task_id: str, path: Path) -> bool:
+        """
+        Remove an expired lease, only one node can move a given lease file away
+        """
+        lease = read_lease(path)
+        if lease is None or not self._is_expired(path):
+            # leases are linked in complete, a missing one was just released
+            return lease is None and not path.exists()
+        stale_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.stale')
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        stale = read_lease(stale_path)
+        if stale is None or stale.get('token') != lease.get('token') or not self._is_expired(stale_path):
+            # raced with a fresh claim, put it back unless someone claimed again
+            try:
+                os.link(stale_path, path)
+            except FileExistsError:
+                pass
+            os.unlink(stale_path)
+            return False
+        os.unlink(stale_path)
+        logger.warning(f'Reclaimed expired lease of task {task_id} from node {lease.get("node")}')
+        return True
+
+
+def read_lease(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def run_harness(
+        processes: int = 3,
+        tasks: int = 12,
+        lease_ttl: float = 2.0,
+        note_size: int = 20000,
+        timeout: float = 300.0) -> Dict[str, int]:
+    """
+    Run convert_queue in several processes on dummy notes sharing one temp queue directory,
+    kill the first process while it holds a lease, then count done markers and completions
+    """
+    import multiprocessing
+    import signal
+    import tempfile
+    from batch_parser import convert_queue
+
+    with tempfile.TemporaryDirectory() as root:
+        workdir = Path(root)
+        queue_dir = workdir / 'queue'
+        output_dir = workdir / 'output'
+        task_list = []
+        for i in range(tasks):
+            note_file = workdir / f'note{i}.boxnote'
+            # large enough that a conversion takes a noticeable share of a second
+            paragraphs = [{'type': 'paragraph', 'content': [{'type': 'text', 'text': f'note {i} line {j}'}]}
+                          for j in range(note_size)]
+            content = {'doc': {'type': 'doc', 'content': paragraphs}}
+            note_file.write_text(json.dumps(content), encoding='utf-8')
+            task_list.append((note_file, None))
+        output_dir.mkdir()
+        workers = []
+        for i in range(processes):
+            offset = i * tasks // processes
+            worker = multiprocessing.Process(
+                target=convert_queue,
+                args=(task_list[offset:] + task_list[:offset], queue_dir, f'harness-{i}', lease_ttl, workdir, output_dir),
+                kwargs={'output_formats': ('html',), 'poll_interval': lease_ttl / 4})
+            worker.start()
+            workers.append(worker)
+
+        # kill the first worker as soon as it is seen holding a lease
+        killed = False
+        deadline = time.time() + timeout
+        while not killed and workers[0].is_alive() and time.time() < deadline:
+            for path in queue_dir.glob('leases/*.lease'):
+                lease = read_lease(path)
+                if lease is not None and lease.get('node') == 'harness-0':
+                    os.kill(workers[0].pid, signal.SIGKILL)
+                    killed = True
+                    logger.info(f'Killed harness-0 while holding {path.name}')
+                    break
+            time.sleep(0.01)
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.time()))
+            if worker.is_alive():
+                worker.kill()
+
+        queue = WorkQueue(queue_dir, 'harness')
+        task_ids = [queue.task_id(path.name, '') for path, _ in task_list]
+        done_files = list(queue.done_dir.glob('*.done'))
+        completions = [queue.completions(task_id) for task_id in task_ids]
+        return {
+            'tasks': tasks,
+            'killed_mid_lease': int(killed),
+            'done': sum(1 for task_id in task_ids if queue.is_done(task_id)),
+            'stray_done': len(done_files) - sum(1 for task_id in task_ids if queue.is_done(task_id)),
+            'completed_twice': sum(1 for count in completions if count > 1),
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--harness', action='store_true', help='Run the multi-process work queue harness and exit')
+    parser.add_argument('-n', '--processes', type=int, default=3, help='Worker processes sharing the queue')
+    parser.add_argument('-t', '--tasks', type=int, default=12, help='Dummy notes to convert')
+    parser.add_argument('--lease-ttl', type=float, default=2.0, help='Lease ttl of the harness in seconds')
+    parser.add_argument('--note-size', type=int, default=20000, help='Paragraphs per dummy note')
+    args = parser.parse_args()
+    if not args.harness:
+        parser.error('nothing to do, pass --harness')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = run_harness(args.processes, args.tasks, args.lease_ttl, args.note_size)
+    logger.info(f'Harness result: {result}')
+    ok = result['killed_mid_lease'] and result['done'] == result['tasks'] \
+        and not result['stray_done'] and not result['completed_twice']
+    raise SystemExit(0 if ok else 1)